@@ -1,6 +1,8 @@
 from fastapi import FastAPI, status, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from .models import SolarPanelInput, OkResponse, CreatedResponse
+from .services.electricity import get_electricity
 from .services.solar_panel import SolarPanelPayback
 from .exceptions import CalculationException
 from .logger import logger
@@ -15,10 +17,13 @@ async def calculation_exception_handler(request, exc: CalculationException):
 
 
 async def get_solar_panel_payback(solar_panel_input: SolarPanelInput) -> SolarPanelPayback:
+    # The first call loads the data files, keep it off the event loop and let load errors surface as 5xx
+    electricity = await run_in_threadpool(get_electricity)
     return SolarPanelPayback(
         solar_panel_input.annual_energy_consumption,
         solar_panel_input.installation_cost,
         solar_panel_input.wp_of_installation,
+        electricity,
     )
 
 @app.post(
@@ -41,7 +46,7 @@ async def get_solar_panel_payback(solar_panel_input: SolarPanelInput) -> SolarPa
 )
 async def calculate_payback_time(solar_panel: SolarPanelPayback = Depends(get_solar_panel_payback)):
     try:
-        payback_time = await solar_panel.calculate_payback_time()
+        payback_time = solar_panel.calculate_all()["payback_time"]
         logger.info(f"Calculated payback time: {payback_time}")
         return {"message": "Payback time calculated successfully", "data": {"payback_time": payback_time}}
     except Exception as e:
@@ -70,9 +75,33 @@ async def calculate_payback_time(solar_panel: SolarPanelPayback = Depends(get_so
 )
 async def calculate_optimal_wp(solar_panel: SolarPanelPayback = Depends(get_solar_panel_payback)):
     try:
-        optimal_wp = await solar_panel.calculate_optimal_wp()
+        optimal_wp = solar_panel.calculate_all()["optimal_wp"]
         logger.info(f"Calculated optimal Wp: {optimal_wp}")
         return {"message": "Optimal Wp calculated successfully", "data": {"optimal_wp": optimal_wp}}
     except Exception as e:
         logger.error(f"Error occurred while calculating optimal Wp: {str(e)}")
         raise CalculationException("Error occurred while calculating optimal Wp")
+
+
+@app.post(
+    "/calculate",
+    response_model=CreatedResponse,
+    status_code=status.HTTP_200_OK,
+    description="Calculates the payback time, the optimal Wp and the payback time at the optimal Wp in a single request",
+    tags=["Payback Time Calculation", "Optimal Wp Calculation"],
+    summary="Calculate Payback Time and Optimal Wp",
+    responses={
+        status.HTTP_200_OK: {
+            "model": CreatedResponse,
+            "description": "OK response, the payback time and optimal Wp have been successfully calculated",
+        },
+    },
+)
+async def calculate(solar_panel: SolarPanelPayback = Depends(get_solar_panel_payback)):
+    try:
+        results = solar_panel.calculate_all()
+        logger.info(f"Calculated payback time and optimal Wp: {results}")
+        return {"message": "Payback time and optimal Wp calculated successfully", "data": results}
+    except Exception as e:
+        logger.error(f"Error occurred while calculating payback time and optimal Wp: {str(e)}")
+        raise CalculationException("Error occurred while calculating payback time and optimal Wp")
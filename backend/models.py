@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class SolarPanelInput(BaseModel):
@@ -6,14 +6,15 @@ class SolarPanelInput(BaseModel):
     installation_cost: float = Field(..., gt=0, description="Installation cost in €")
     wp_of_installation: int = Field(..., gt=0, description="Installation capacity in Wp")
 
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "annual_energy_consumption": 5000,
                 "installation_cost": 10000,
                 "wp_of_installation": 5000,
             }
         }
+    )
 
 
 
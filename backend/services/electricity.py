@@ -1,26 +1,105 @@
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import numpy as np
 import pandas as pd
-from xlrd import xldate_as_datetime
 from ..logger import logger
-from typing import ClassVar
+from dataclasses import dataclass
+from typing import Callable, ClassVar
 from pathlib import Path
 
+try:
+    import python_calamine  # noqa: F401
+except ImportError:
+    python_calamine = None
+
+_EURO_RE = re.compile(r"[€,]")
+
+
+@dataclass(frozen=True, slots=True)
+class ElectricityConst:
+    """
+    Constants the electricity cost calculations depend on.
+    """
+    production_sum: float
+    consumption_sum: float
+    grid_price: float
+    grid_sell_price: float
+
+
+def _total_cost(
+    production_sum: float,
+    consumption_sum: float,
+    grid_price: float,
+    grid_sell_price: float,
+    annual_energy_consumption: float,
+    wp_of_installation: float,
+) -> tuple[float, ...]:
+    """
+    Scalar cost model behind Electricity.calculate_total_cost.
+    Returns every intermediate value so the caller can log the breakdown.
+
+    :param production_sum: Sum of the production profile
+    :param consumption_sum: Sum of the consumption profile
+    :param grid_price: Price of buying energy from the grid per kWh
+    :param grid_sell_price: Price of selling energy to the grid per kWh
+    :param annual_energy_consumption: Estimated annual energy consumption in kWh
+    :param wp_of_installation: Power of the solar installation in watts peak (Wp)
+    """
+    total_energy_produced_kwh = (production_sum * wp_of_installation * 0.25) / 1000
+    total_energy_consumed = consumption_sum * annual_energy_consumption
+
+    # Only one of the two flows is ever non-zero
+    energy_balance = total_energy_consumed - total_energy_produced_kwh
+    if energy_balance >= 0:
+        energy_from_grid, energy_to_grid = energy_balance, 0.0
+    else:
+        energy_from_grid, energy_to_grid = 0.0, -energy_balance
+
+    cost_from_grid = energy_from_grid * grid_price
+    revenue_from_grid = energy_to_grid * grid_sell_price
+
+    total_cost = cost_from_grid - revenue_from_grid
+
+    return (
+        total_energy_produced_kwh,
+        total_energy_consumed,
+        energy_from_grid,
+        energy_to_grid,
+        cost_from_grid,
+        revenue_from_grid,
+        total_cost,
+    )
+
+
 class Electricity:
     """
     This class is used to calculate electricity costs.
     """
     GRID_FEE: ClassVar[float] = 0.12
     AREA_PROVIDER: ClassVar[str] = "5414492999998"
+    PRODUCTION_SHEET: ClassVar[str] = "Ex-ante 2023 (IP8)"
+    CONSUMPTION_SKIPROWS: ClassVar[int] = 2
+    # Bump when the preprocessing or the cached values change, to invalidate existing caches
+    CACHE_VERSION: ClassVar[int] = 1
+    # Keep the loaded DataFrames on the instance, only the scalars derived from them are needed otherwise
+    KEEP_PROFILES: ClassVar[bool] = False
 
     def __init__(self, production_profile: Path | str, consumption_profile: Path | str, energy_cost: Path | str):
-        self.production_profile = self._load_data(
-            production_profile,
-            sheet_name="Ex-ante 2023 (IP8)", 
-            usecols=["UTC", self.AREA_PROVIDER],
-            date_column="UTC"
-        )
-        self.consumption_profile = self._load_consumption_data(consumption_profile)
-        self.energy_cost = self._load_cost_data(energy_cost)
-        self._calculate_grid_prices()
+        if self.KEEP_PROFILES:
+            self.production_profile = self._load_cached(
+                production_profile, self._load_production_data, self._production_read_params()
+            )
+            self.consumption_profile = self._load_cached(
+                consumption_profile, self._load_consumption_data, self._consumption_read_params()
+            )
+            self.energy_cost = self._load_cached(energy_cost, self._load_cost_data, {})
+        production_sum, consumption_sum = self._precompute_profile_sums(production_profile, consumption_profile)
+        grid_price, grid_sell_price = self._calculate_grid_prices(energy_cost)
+        self.const = ElectricityConst(production_sum, consumption_sum, grid_price, grid_sell_price)
 
 
     @classmethod
@@ -33,11 +112,28 @@ class Electricity:
     
     
     @staticmethod
+    def _read_excel(file_path: Path | str, **kwargs) -> pd.DataFrame:
+        """
+        Reads an Excel file with calamine, falling back to pyxlsb for .xlsb
+        and to openpyxl in read-only mode for .xlsx when it is not installed.
+
+        :param file_path: Path or str to the data file
+        :param kwargs: Keyword arguments passed to pd.read_excel
+        """
+        if python_calamine is not None:
+            return pd.read_excel(file_path, engine="calamine", **kwargs)
+        if Path(file_path).suffix == ".xlsb":
+            return pd.read_excel(file_path, engine="pyxlsb", **kwargs)
+        return pd.read_excel(file_path, engine="openpyxl", engine_kwargs={"read_only": True, "data_only": True}, **kwargs)
+
+    @classmethod
     def _load_data(
-        file_path: Path | str, 
+        cls,
+        file_path: Path | str,
         sheet_name: str = None, 
         skiprows: int = None, 
-        usecols: list[str] = None, 
+        usecols: list[str] | Callable[[str], bool] = None, 
+        dtype: dict[str, str] = None,
         date_column: str = None
     ) -> pd.DataFrame:
         """
@@ -46,87 +142,294 @@ class Electricity:
         :param file_path: Path or str to the data file
         :param sheet_name: Name of the sheet to read from
         :param skiprows: Number of rows to skip at the start
-        :param usecols: List of column names to use
-        :param date_column: Column name to convert to datetime and set as index
+        :param usecols: List of column names to use, or a function selecting them by name
+        :param dtype: Data types of the columns by name
+        :param date_column: Column name to parse as datetime and set as index
         """
-        df = pd.read_excel(file_path, sheet_name=sheet_name, skiprows=skiprows, usecols=usecols)
+        df = cls._read_excel(
+            file_path,
+            sheet_name=sheet_name,
+            skiprows=skiprows,
+            usecols=usecols,
+            dtype=dtype,
+            parse_dates=[date_column] if date_column else False
+        )
         if date_column:
-            df[date_column] = pd.to_datetime(df[date_column])
             df.set_index(date_column, inplace=True)
         return df
 
+    def _load_production_data(self, file_path: Path | str) -> pd.DataFrame:
+        """
+        Loads production data from an Excel file.
+
+        :param file_path: Path or str to the data file
+        """
+        return self._load_data(
+            file_path,
+            sheet_name=self.PRODUCTION_SHEET,
+            usecols=lambda column: column in {"UTC", self.AREA_PROVIDER},
+            dtype={self.AREA_PROVIDER: "float64"},
+            date_column="UTC"
+        )
+
     def _load_consumption_data(self, file_path: Path | str) -> pd.DataFrame:
         """
         Loads consumption data from an Excel file.
         
         :param file_path: Path or str to the data file
         """
-        df = pd.read_excel(file_path, skiprows=2, usecols=["CET", self.AREA_PROVIDER])
-        df["CET"] = df["CET"].apply(lambda x: xldate_as_datetime(float(x), 0))
+        df = self._read_excel(
+            file_path,
+            skiprows=self.CONSUMPTION_SKIPROWS,
+            usecols=lambda column: column in {"CET", self.AREA_PROVIDER},
+            dtype={self.AREA_PROVIDER: "float64"}
+        )
+        if pd.api.types.is_numeric_dtype(df["CET"]):
+            # pyxlsb returns Excel serial dates, days since 1899-12-30 in the 1900 date system
+            df["CET"] = pd.to_datetime(df["CET"].astype("float64"), unit="D", origin="1899-12-30").dt.round("ms")
         df.set_index("CET", inplace=True)
         return df
 
-    @staticmethod
-    def _load_cost_data(file_path: Path | str) -> pd.DataFrame:
+    @classmethod
+    def _load_cost_data(cls, file_path: Path | str) -> pd.DataFrame:
         """
         Loads cost data from an Excel file.
         
         :param file_path: Path or str to the data file
         """
-        df = pd.read_excel(file_path)
+        df = cls._read_excel(file_path)
         df["Date"] = pd.to_datetime(df["Date"])
         df.set_index("Date", inplace=True)
-        df["Euro"] = df["Euro"].replace("[\€,]", "", regex=True).astype(float)
+        df["Euro"] = df["Euro"].replace(_EURO_RE, "", regex=True).astype(float)
+        return df
+
+    def _production_read_params(self) -> dict:
+        """
+        Parameters the production profile is read with, part of its cache key.
+        """
+        return {
+            "area_provider": self.AREA_PROVIDER,
+            "sheet_name": self.PRODUCTION_SHEET,
+        }
+
+    def _consumption_read_params(self) -> dict:
+        """
+        Parameters the consumption profile is read with, part of its cache key.
+        """
+        return {
+            "area_provider": self.AREA_PROVIDER,
+            "skiprows": self.CONSUMPTION_SKIPROWS,
+        }
+
+    def _cache_key(self, file_path: Path, read_params: dict) -> dict:
+        """
+        Identifies what a cache was built from: the source file and the parameters it was read with.
+
+        :param file_path: Path to the source data file
+        :param read_params: Parameters the source data file is read with
+        """
+        stat = file_path.stat()
+        return {"source": [stat.st_mtime_ns, stat.st_size], "version": self.CACHE_VERSION, **read_params}
+
+    @staticmethod
+    def _write_atomically(path: Path, write: Callable[[Path], None]) -> None:
+        """
+        Writes a file through a temporary file in the same directory, so readers never see it half-written.
+
+        :param path: Path of the file to write
+        :param write: Function writing the content to the path it is given
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        os.close(fd)
+        try:
+            write(Path(tmp_path))
+            # mkstemp creates the file readable by its owner only
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def _read_cache_meta(self, file_path: Path | str, read_params: dict) -> dict:
+        """
+        Reads the JSON sidecar describing the cache of a source file.
+        Returns an empty dict when it is missing, or when the source or the way it is read
+        has changed since it was written.
+
+        :param file_path: Path or str to the source data file
+        :param read_params: Parameters the source data file is read with
+        """
+        file_path = Path(file_path)
+        try:
+            meta = json.loads(file_path.with_suffix(".json").read_text())
+        except (OSError, ValueError):
+            return {}
+        return meta if meta.get("key") == self._cache_key(file_path, read_params) else {}
+
+    def _update_cache_meta(self, file_path: Path | str, read_params: dict, **values) -> None:
+        """
+        Stores values in the JSON sidecar of a source file, keyed by the source and how it is read.
+
+        :param file_path: Path or str to the source data file
+        :param read_params: Parameters the source data file is read with
+        :param values: Values to store alongside the existing ones
+        """
+        file_path = Path(file_path)
+        meta = self._read_cache_meta(file_path, read_params) | values
+        meta["key"] = self._cache_key(file_path, read_params)
+        try:
+            self._write_atomically(file_path.with_suffix(".json"), lambda path: path.write_text(json.dumps(meta)))
+        except OSError as e:
+            logger.warning(f"Could not write cache metadata for {file_path}: {e}")
+
+    def _load_cached(
+        self,
+        file_path: Path | str,
+        loader: Callable[[Path], pd.DataFrame],
+        read_params: dict
+    ) -> pd.DataFrame:
+        """
+        Loads a preprocessed DataFrame from its Parquet cache beside the source file,
+        parsing the source with the loader and refreshing the cache when it is stale or unreadable.
+
+        :param file_path: Path or str to the source data file
+        :param loader: Function parsing the source data file
+        :param read_params: Parameters the loader reads the source data file with
+        """
+        file_path = Path(file_path)
+        cache_path = file_path.with_suffix(".parquet")
+        if self._read_cache_meta(file_path, read_params).get("parquet") and cache_path.exists():
+            try:
+                return pd.read_parquet(cache_path, engine="pyarrow")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read Parquet cache for {file_path}, reloading it: {e}")
+
+        df = loader(file_path)
+        try:
+            self._write_atomically(cache_path, lambda path: df.to_parquet(path, engine="pyarrow"))
+        except OSError as e:
+            logger.warning(f"Could not write Parquet cache for {file_path}: {e}")
+        else:
+            self._update_cache_meta(file_path, read_params, parquet=True)
         return df
 
-    def _calculate_grid_prices(self):
+    def _cached_scalar(
+        self,
+        file_path: Path | str,
+        key: str,
+        loader: Callable[[Path], pd.DataFrame],
+        reduce: Callable[[pd.DataFrame], float],
+        read_params: dict
+    ) -> float:
+        """
+        Returns a scalar derived from a source file, cached in its JSON sidecar.
+        The DataFrame is only loaded when the cached value is missing or stale.
+
+        :param file_path: Path or str to the source data file
+        :param key: Name of the value in the sidecar
+        :param loader: Function parsing the source data file
+        :param reduce: Function deriving the value from the loaded DataFrame
+        :param read_params: Parameters the loader reads the source data file with
+        """
+        meta = self._read_cache_meta(file_path, read_params)
+        if key in meta:
+            return meta[key]
+        value = reduce(self._load_cached(file_path, loader, read_params))
+        self._update_cache_meta(file_path, read_params, **{key: value})
+        return value
+
+    def _precompute_profile_sums(
+        self,
+        production_profile: Path | str,
+        consumption_profile: Path | str
+    ) -> tuple[float, float]:
+        """
+        Sums the production and consumption profiles once, they never change after load.
+
+        :param production_profile: Path or str to the production profile file
+        :param consumption_profile: Path or str to the consumption profile file
+        """
+        production_sum = self._cached_scalar(
+            production_profile,
+            "sum",
+            self._load_production_data,
+            lambda df: float(df[self.AREA_PROVIDER].to_numpy(dtype=np.float64, copy=False).sum()),
+            self._production_read_params()
+        )
+        consumption_sum = self._cached_scalar(
+            consumption_profile,
+            "sum",
+            self._load_consumption_data,
+            lambda df: float(df[self.AREA_PROVIDER].to_numpy(dtype=np.float64, copy=False).sum()),
+            self._consumption_read_params()
+        )
+        return production_sum, consumption_sum
+
+    def _calculate_grid_prices(self, energy_cost: Path | str) -> tuple[float, float]:
         """
         Calculates the price of buying and selling energy to/from the grid.
+
+        :param energy_cost: Path or str to the energy cost file
         """
-        energy_cost_kwh = self.energy_cost["Euro"].mean() / 1000
+        mean_energy_cost = self._cached_scalar(
+            energy_cost,
+            "mean",
+            self._load_cost_data,
+            lambda df: float(df["Euro"].mean()),
+            {}
+        )
+        energy_cost_kwh = mean_energy_cost / 1000
         logger.info(f"energy_cost_kwh {energy_cost_kwh}")
-        self.grid_price = (energy_cost_kwh * 1.20) + self.GRID_FEE
-        self.grid_sell_price = energy_cost_kwh * 0.80
+        grid_price = (energy_cost_kwh * 1.20) + self.GRID_FEE
+        grid_sell_price = energy_cost_kwh * 0.80
+        return grid_price, grid_sell_price
 
-    async def calculate_total_cost(self, annual_energy_consumption: float, wp_of_installation: int) -> float:
+    def calculate_total_cost(self, annual_energy_consumption: float, wp_of_installation: int) -> float:
         """
         Calculates the total cost of energy consumption and production.
         
         :param annual_energy_consumption: Estimated annual energy consumption in kWh
         :param wp_of_installation: Power of the solar installation in watts peak (Wp)
         """
-        total_energy_produced_kwh = (self.production_profile[self.AREA_PROVIDER].sum() * wp_of_installation * 0.25) / 1000
-        total_energy_consumed = self.consumption_profile[self.AREA_PROVIDER].sum() * annual_energy_consumption
-
-        energy_from_grid, energy_to_grid = self._calculate_energy_flow(total_energy_produced_kwh, total_energy_consumed)
+        const = self.const
+        results = _total_cost(
+            const.production_sum,
+            const.consumption_sum,
+            const.grid_price,
+            const.grid_sell_price,
+            float(annual_energy_consumption),
+            float(wp_of_installation),
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            self._log_calculation_results(*results)
+        return results[-1]
 
-        cost_from_grid = energy_from_grid * self.grid_price
-        revenue_from_grid = energy_to_grid * self.grid_sell_price
+    def calculate_total_costs(self, annual_energy_consumption: float, wps: np.ndarray) -> np.ndarray:
+        """
+        Vectorized calculate_total_cost over an array of installation powers.
 
-        total_cost = cost_from_grid - revenue_from_grid
+        The cost must stay piecewise-linear in Wp with a single kink at the break-even Wp:
+        SolarPanelPayback._wp_candidates relies on that shape to skip most of the Wp range.
 
-        self._log_calculation_results(
-            total_energy_produced_kwh,
-            total_energy_consumed, energy_from_grid, 
-            energy_to_grid, 
-            cost_from_grid, 
-            revenue_from_grid, 
-            total_cost
-        )
+        :param annual_energy_consumption: Estimated annual energy consumption in kWh
+        :param wps: Powers of the solar installation in watts peak (Wp)
+        """
+        const = self.const
+        total_energy_produced_kwh = (const.production_sum * wps * 0.25) / 1000
+        total_energy_consumed = const.consumption_sum * annual_energy_consumption
 
-        return total_cost
+        # Energy is bought at grid_price when consumption exceeds production and sold at grid_sell_price otherwise
+        energy_balance = total_energy_consumed - total_energy_produced_kwh
+        return np.where(energy_balance >= 0, energy_balance * const.grid_price, energy_balance * const.grid_sell_price)
 
-    @staticmethod
-    def _calculate_energy_flow(total_energy_produced: float, total_energy_consumed: float) -> tuple[float]:
+    def calculate_breakeven_wp(self, annual_energy_consumption: float) -> float:
         """
-        Calculates the amount of energy bought from or sold to the grid.
-        
-        :param total_energy_produced: Total amount of energy produced in kWh
-        :param total_energy_consumed: Total amount of energy consumed in kWh
+        Calculates the installation power at which production equals consumption.
+
+        :param annual_energy_consumption: Estimated annual energy consumption in kWh
         """
-        energy_from_grid = max(0, total_energy_consumed - total_energy_produced)
-        energy_to_grid = max(0, total_energy_produced - total_energy_consumed)
-        return energy_from_grid, energy_to_grid
+        const = self.const
+        return (const.consumption_sum * annual_energy_consumption * 1000) / (const.production_sum * 0.25)
 
     def _log_calculation_results(
             self, 
@@ -137,15 +440,27 @@ class Electricity:
             cost_from_grid, 
             revenue_from_grid, total_cost
         ) -> None:
-        logger.info(f"total_energy_produced_kwh {total_energy_produced}")
-        logger.info(f"total_energy_consumed {total_energy_consumed}")
-        logger.info(f"energy_from_grid {energy_from_grid}")
-        logger.info(f"energy_to_grid {energy_to_grid}")
-        logger.info(f"cost_from_grid {cost_from_grid}")
-        logger.info(f"revenue_from_grid {revenue_from_grid}")
-        logger.info(f"total_cost {total_cost}")
+        logger.debug(f"total_energy_produced_kwh {total_energy_produced}")
+        logger.debug(f"total_energy_consumed {total_energy_consumed}")
+        logger.debug(f"energy_from_grid {energy_from_grid}")
+        logger.debug(f"energy_to_grid {energy_to_grid}")
+        logger.debug(f"cost_from_grid {cost_from_grid}")
+        logger.debug(f"revenue_from_grid {revenue_from_grid}")
+        logger.debug(f"total_cost {total_cost}")
+
 
 
+_electricity: Electricity | None = None
+_electricity_lock = threading.Lock()
 
 
-ELECTRICITY = Electricity.create_from_spreadsheets()
+def get_electricity() -> Electricity:
+    """
+    Returns the Electricity instance built from the bundled spreadsheets, loading them on first use.
+    Thread-safe, so concurrent first requests load the data only once.
+    """
+    global _electricity
+    with _electricity_lock:
+        if _electricity is None:
+            _electricity = Electricity.create_from_spreadsheets()
+        return _electricity
@@ -1,46 +1,101 @@
-from .electricity import ELECTRICITY
+import logging
+import numpy as np
+from typing import ClassVar
+from .electricity import Electricity
 from ..logger import logger
 
 class SolarPanelPayback:
     """
     This class is used to calculate the payback time of solar panels
     """
-    def __init__(self, annual_energy_consumption, installation_cost, wp_of_installation):
+    WP_STEP: ClassVar[int] = 10
+    # Evaluate every step of the Wp range instead of the closed-form candidates, to validate them
+    USE_WP_SWEEP: ClassVar[bool] = False
+
+    def __init__(self, annual_energy_consumption, installation_cost, wp_of_installation, electricity: Electricity):
         self.annual_energy_consumption = annual_energy_consumption
         self.installation_cost = installation_cost
         self.wp_of_installation = wp_of_installation
+        self.electricity = electricity
 
-    async def calculate_payback_time(self) -> float:
+    def calculate_payback_time(self) -> float:
         """
         Calculates the payback time of the solar panel installation.
 
         :return: The payback period in years
         """
-        annual_cost_savings = -1 * await ELECTRICITY.calculate_total_cost(self.annual_energy_consumption, self.wp_of_installation)
-        logger.info(f"Annual cost savings: {annual_cost_savings}")
+        annual_cost_savings = -1 * self.electricity.calculate_total_cost(
+            self.annual_energy_consumption, self.wp_of_installation
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Annual cost savings: {annual_cost_savings}")
         payback_period = self.installation_cost / annual_cost_savings
         return payback_period
 
-    async def calculate_optimal_wp(self) -> int:
+    def calculate_optimal_wp(self) -> int:
         """
         Calculates the optimal power of the solar installation in watts peak (Wp) to minimize the payback period.
 
         :return: The optimal power in Wp
         """
+        wps, payback_periods = self._payback_periods()
+        return int(wps[np.argmin(payback_periods)])
+
+    def calculate_all(self) -> dict[str, float | int]:
+        """
+        Calculates the payback time, the optimal Wp and the payback time at that optimal Wp
+        from a single evaluation of the Wp range.
+
+        :return: The payback period in years, the optimal power in Wp and the payback period in years at the optimal power
+        """
+        wps, payback_periods = self._payback_periods()
+        optimal_index = np.argmin(payback_periods)
+        return {
+            # The installed power is always the first Wp evaluated
+            "payback_time": float(payback_periods[0]),
+            "optimal_wp": int(wps[optimal_index]),
+            "min_payback_at_optimal": float(payback_periods[optimal_index]),
+        }
+
+    def _payback_periods(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Calculates the payback periods of the Wp values that can hold the shortest one.
+
+        :return: The Wp values, starting with the installed power, and their payback periods in years
+        """
         fixed_cost = 1000
         variable_cost_per_wp = (self.installation_cost - fixed_cost) / self.wp_of_installation
 
-        min_payback_period = float('inf')
-        optimal_wp = 0
+        wps = self._wp_sweep() if self.USE_WP_SWEEP else self._wp_candidates()
+        # Same as fixed_cost + variable_cost_per_wp * wps, but exactly installation_cost at the installed power
+        total_costs = self.installation_cost + (variable_cost_per_wp * (wps - self.wp_of_installation))
+        annual_savings = -1 * self.electricity.calculate_total_costs(self.annual_energy_consumption, wps)
+        return wps, total_costs / annual_savings
 
-        for wp in range(self.wp_of_installation, 2 * self.wp_of_installation + 1, 10):
-            total_cost = fixed_cost + (variable_cost_per_wp * wp)
-            annual_savings = -1 * await ELECTRICITY.calculate_total_cost(self.annual_energy_consumption, wp)
-            payback_period = total_cost / annual_savings
+    def _wp_sweep(self) -> np.ndarray:
+        """
+        Every Wp from the installed power to twice its value, in steps of WP_STEP.
+        """
+        wp_of_installation = self.wp_of_installation
+        return np.arange(wp_of_installation, 2 * wp_of_installation + 1, self.WP_STEP, dtype=np.float64)
 
-            if payback_period < min_payback_period:
-                min_payback_period = payback_period
-                optimal_wp = wp
+    def _wp_candidates(self) -> np.ndarray:
+        """
+        The only points of the Wp range that can hold the shortest payback period.
+
+        The range is the one covered by _wp_sweep.
+
+        On either side of the break-even Wp (production equals consumption) the payback period is a
+        linear-fractional function of Wp, hence monotone, so its minimum lies on the range endpoints
+        or on the steps surrounding the break-even point.
+        """
+        wp_of_installation = self.wp_of_installation
+        wp_step = self.WP_STEP
 
-        return optimal_wp
+        last_step = wp_of_installation // wp_step
+        breakeven_wp = self.electricity.calculate_breakeven_wp(self.annual_energy_consumption)
+        breakeven_step = (breakeven_wp - wp_of_installation) / wp_step
+        lower, upper = np.floor(breakeven_step), np.ceil(breakeven_step)
 
+        steps = np.clip([0, lower - 1, lower, upper, upper + 1, last_step], 0, last_step)
+        return wp_of_installation + wp_step * np.unique(steps)